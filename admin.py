@@ -1,27 +1,79 @@
+import os
 import sys
 import json
 import time
+import tempfile
 import subprocess
+import copy
+import statistics
+from array import array
+from collections import OrderedDict, deque
+import numpy as np
 import paho.mqtt.client as mqtt
+from tally import TopKCounter, InstantRunoff, TOP_K, valid_answers, counted_choices
+from broker import resolve_broker, start_local_broker
+from results_server import ResultsState, serve_in_thread, HTTP_PORT
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QHBoxLayout, QVBoxLayout,
-    QFrame, QLabel, QScrollArea, QPushButton, QSizePolicy
+    QFrame, QLabel, QScrollArea, QPushButton, QSizePolicy, QMessageBox
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QObject
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QTimer
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 # -------- CONFIG --------
-BROKER         = "broker.hivemq.com"
-PORT           = 1883
+BROKER         = os.environ.get("VOTINGLIVE_BROKER", "broker.hivemq.com")  # hôte, "local" ou "auto"
+PORT           = int(os.environ.get("VOTINGLIVE_PORT", 1883))
 TOPIC_VOTE     = "votinglivepoll/vote"
 TOPIC_QUESTION = "votinglivepoll/question"
+RENDER_CACHE_SIZE   = 8     # sondages gardés prêts à l'affichage
+CACHE_RENDER_PIXELS = True  # garde aussi l'image rendue des graphiques
+SKEW_WINDOW         = 32    # votes par client pour estimer le décalage d'horloge
+SKEW_MIN_SAMPLES    = 3     # votes d'un client avant de compter son retard dans la médiane
+LATENCY_WINDOW      = 200   # délais gardés par sondage pour la médiane
+MEMORY_BUDGET_MB    = float(os.environ.get("VOTINGLIVE_MEMORY_MB", 64))
+MEMORY_LOW_WATER    = 0.75  # au-delà du budget, on libère jusqu'à cette fraction
+IDLE_SECONDS        = 300   # sondage sans vote depuis ce délai : séries écrites sur disque
+SPILL_MIN_IDLE      = 30    # secondes sans vote avant d'écrire un sondage sur disque
+RETENTION_CHECK_MS  = 5000
+SPILL_DIR           = os.path.join(tempfile.gettempdir(), "votinglive")
 # ------------------------
 
+# t : temps relatif, c : indice du choix, n : nombre de bulletins après ce vote
+SPILL_DTYPE     = np.dtype([("t", "f8"), ("c", "u4"), ("n", "u4")])
+BYTES_PER_POINT = 72  # tuple (t, n) + case de liste, par point de série
+PLOT_BYTES_PER_POINT = 64  # x et y en listes (flottant + case), par point préparé
+
 
 class Communicate(QObject):
-    new_poll = pyqtSignal(int, str, list)
-    new_vote = pyqtSignal(str, str, float)
+    new_poll = pyqtSignal(int, str, list, dict)
+    new_vote = pyqtSignal(str, list, str, float, float)
+
+
+class SkewEstimator:
+    """Estime le décalage d'horloge de chaque client à partir des heures de réception.
+
+    Le plus petit écart (réception - envoi) observé sur les derniers votes d'un
+    client correspond à son décalage plus le délai minimal du réseau : c'est ce
+    qu'on retranche pour ramener ses horodatages sur l'horloge locale.
+    """
+
+    def __init__(self, window=SKEW_WINDOW, min_samples=SKEW_MIN_SAMPLES):
+        self.window      = window
+        self.min_samples = min_samples
+        self.offsets     = {}
+
+    def correct(self, session, sent, received):
+        """Renvoie (horodatage corrigé, délai au-delà du minimum observé) pour un vote
+        de la session client `session`.
+
+        Le délai vaut None tant que la session compte moins de `min_samples` votes :
+        le premier est toujours à 0 par construction et fausserait la médiane."""
+        offs = self.offsets.setdefault(session, deque(maxlen=self.window))
+        offs.append(received - sent)
+        corrected = min(sent + min(offs), received)
+        delay = received - corrected if len(offs) >= self.min_samples else None
+        return corrected, delay
 
 
 class VoteResults(QWidget):
@@ -32,10 +84,26 @@ class VoteResults(QWidget):
         self.resize(1250, 800)
 
         self.polls                  = []
+        self.poll_index             = {}
         self.vote_counts_list       = []
         self.time_series_total_list = []
         self.series_per_choice_list = []
+        self.vote_logs              = []
         self.start_times            = []
+        self.last_activity          = []
+        self.spilled                = []
+        self.latencies_list         = []
+        self.versions               = []
+
+        self.skew = SkewEstimator()
+
+        # idx -> {"version", "data", "pixels", "pixel_bytes"}, du moins au plus récent
+        self.render_cache = OrderedDict()
+        self.axes_key     = None
+        self.broker_proc  = None
+        # serveur de résultats web, lancé au plus une fois depuis l'admin
+        self.web_state    = None
+        self.web_loop     = None
 
         self.comm = Communicate()
         self.comm.new_poll.connect(self.add_poll)
@@ -44,6 +112,10 @@ class VoteResults(QWidget):
         self.init_ui()
         self.init_mqtt()
 
+        self.retention_timer = QTimer(self)
+        self.retention_timer.timeout.connect(self.enforce_retention)
+        self.retention_timer.start(RETENTION_CHECK_MS)
+
         self.show()
 
     def init_ui(self):
@@ -83,10 +155,16 @@ class VoteResults(QWidget):
             }
         """)
         run_btn.clicked.connect(
-            lambda: subprocess.Popen([sys.executable, "question_creation.py"])
+            lambda: subprocess.Popen([sys.executable, "question_creation.py"], env=self.child_env)
         )
         left.addWidget(run_btn)
 
+        self.web_btn = QPushButton("Lancer le serveur de résultats web")
+        self.web_btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.web_btn.setStyleSheet(run_btn.styleSheet())
+        self.web_btn.clicked.connect(self.start_web_server)
+        left.addWidget(self.web_btn)
+
         root.addLayout(left, 1)
 
         right = QVBoxLayout()
@@ -100,6 +178,10 @@ class VoteResults(QWidget):
         self.question_lbl.setWordWrap(True)
         right.addWidget(self.question_lbl)
 
+        self.latency_lbl = QLabel("")
+        self.latency_lbl.setStyleSheet("QLabel { color:#b8a0d0; font-size:13px; }")
+        right.addWidget(self.latency_lbl)
+
         content = QHBoxLayout()
         content.setSpacing(20)
 
@@ -138,36 +220,114 @@ class VoteResults(QWidget):
 
         right.addLayout(evo, 1)
 
+        for cv in self.canvases():
+            cv.mpl_connect("resize_event", self.on_canvas_resize)
+
         root.addLayout(right, 3)
 
     def init_mqtt(self):
-        self.client = mqtt.Client()
-        self.client.on_connect = lambda c, u, f, rc: c.subscribe(
-            [(TOPIC_QUESTION, 0), (TOPIC_VOTE, 0)]
-        )
-        self.client.on_message = self.on_message
-        self.client.connect(BROKER, PORT)
+        if BROKER == "local":
+            # broker embarqué : les clients du réseau le trouvent avec VOTINGLIVE_BROKER=auto
+            try:
+                self.broker_proc = start_local_broker(PORT)
+                self.setWindowTitle(f"Poll Manager — broker local (port {PORT})")
+            except ConnectionError as e:
+                # port déjà pris : un broker tourne peut-être déjà sur ce poste
+                self.show_error(f"{e}\nConnexion au broker déjà présent sur le port {PORT}, s'il existe.")
+        try:
+            host, port = resolve_broker(BROKER, PORT)
+            self.client = mqtt.Client()
+            self.client.on_connect = lambda c, u, f, rc: c.subscribe(
+                [(TOPIC_QUESTION, 0), (TOPIC_VOTE, 0)]
+            )
+            self.client.on_message = self.on_message
+            self.client.connect(host, port)
+        except OSError as e:
+            self.show_error(f"Impossible de joindre le broker MQTT : {e}")
+            sys.exit(1)
+        # les fenêtres lancées depuis l'admin utilisent le même broker
+        self.child_env = dict(os.environ, VOTINGLIVE_BROKER=host, VOTINGLIVE_PORT=str(port))
         self.client.loop_start()
 
+    def show_error(self, text):
+        msg = QMessageBox(self)
+        msg.setIcon(QMessageBox.Warning)
+        msg.setWindowTitle("Erreur")
+        msg.setText(text)
+        msg.exec_()
+
+    def start_web_server(self):
+        """Sert les décomptes de l'admin en HTTP, sondages déjà reçus compris."""
+        if self.web_loop is not None:
+            return
+        state = ResultsState()
+        try:
+            loop = serve_in_thread(state)
+        except OSError as e:
+            self.show_error(f"Impossible de lancer le serveur web sur le port {HTTP_PORT} : {e}")
+            return
+        self.web_state = state
+        self.web_loop  = loop
+        # copies : le serveur fait ensuite évoluer ses décomptes de son côté
+        for i, p in enumerate(self.polls):
+            self.forward_web(
+                "add_poll", p["question"], list(p["choices"]), p["write_in"], p["type"],
+                copy.deepcopy(self.vote_counts_list[i]), copy.deepcopy(p["irv"]), p["ballots"],
+            )
+        self.web_btn.setText(f"Résultats web sur le port {HTTP_PORT}")
+        self.web_btn.setEnabled(False)
+
+    def forward_web(self, method, *args):
+        """Relaie un sondage ou un vote au serveur web, s'il tourne."""
+        if self.web_loop is not None:
+            self.web_loop.call_soon_threadsafe(getattr(self.web_state, method), *args)
+
     def on_message(self, client, userdata, msg):
+        received = time.time()
         data = json.loads(msg.payload.decode())
         if msg.topic == TOPIC_QUESTION:
             q  = data.get("question", "")
             cs = data.get("choices", [])
+            opts = {
+                "type":     data.get("type", "single"),
+                "write_in": bool(data.get("write_in", False)),
+            }
             idx = len(self.polls)
-            self.comm.new_poll.emit(idx, q, cs)
+            self.comm.new_poll.emit(idx, q, cs, opts)
         else:
             q  = data.get("question", "")
             ch = data.get("reponse", "")
-            ts = float(data.get("timestamp", time.time()))
-            self.comm.new_vote.emit(q, ch, ts)
-
-    def add_poll(self, idx, question, choices):
-        self.polls.append({"question": question, "choices": choices})
-        self.vote_counts_list.append({c: 0 for c in choices})
+            # anciens clients sans identifiant de session : repli sur le pseudo
+            sid = data.get("session") or data.get("pseudo", "")
+            ts  = float(data.get("timestamp", received))
+            self.comm.new_vote.emit(q, ch if isinstance(ch, list) else [ch], sid, ts, received)
+
+    def add_poll(self, idx, question, choices, options):
+        self.polls.append({
+            "question": question,
+            "choices":  list(choices),
+            "index":    {c: k for k, c in enumerate(choices)},
+            "type":     options.get("type", "single"),
+            "write_in": options.get("write_in", False),
+            "ballots":  0,
+            # vote alternatif : bulletins regroupés et tours en cours
+            "irv":      InstantRunoff(choices) if options.get("type") == "ranked" else None,
+        })
+        self.poll_index.setdefault(question, idx)
+        self.forward_web(
+            "add_poll", question, list(choices),
+            self.polls[-1]["write_in"], self.polls[-1]["type"],
+        )
+        self.vote_counts_list.append(TopKCounter(choices))
         self.time_series_total_list.append([])
-        self.series_per_choice_list.append({c: [] for c in choices})
+        # séries creuses : un point seulement quand le choix reçoit un vote
+        self.series_per_choice_list.append({})
+        self.vote_logs.append((array("d"), array("I"), array("I")))
         self.start_times.append(None)
+        self.last_activity.append(time.monotonic())
+        self.spilled.append(None)
+        self.latencies_list.append(deque(maxlen=LATENCY_WINDOW))
+        self.versions.append(0)
 
         btn = QPushButton(question)
         btn.setStyleSheet(
@@ -177,34 +337,187 @@ class VoteResults(QWidget):
         btn.clicked.connect(lambda _, i=idx: self.show_results(i))
         self.poll_list_layout.insertWidget(self.poll_list_layout.count() - 1, btn)
 
-    def record_vote(self, question, choice, timestamp):
-        for i, p in enumerate(self.polls):
-            if p["question"] == question:
-                cnts = self.vote_counts_list[i]
-                if choice in cnts:
-                    cnts[choice] += 1
-                    if self.start_times[i] is None:
-                        self.start_times[i] = timestamp
-                    t_rel = timestamp - self.start_times[i]
-                    total = sum(cnts.values())
-                    self.time_series_total_list[i].append((t_rel, total))
-                    spc = self.series_per_choice_list[i]
-                    for c, ser in spc.items():
-                        prev = ser[-1][1] if ser else 0
-                        ser.append((t_rel, prev + (1 if c == choice else 0)))
-                    if hasattr(self, "current_idx") and self.current_idx == i:
-                        self.update_ui(i)
-                break
+    def record_vote(self, question, answers, session, sent, received):
+        i = self.poll_index.get(question)
+        if i is None:
+            return
+        p    = self.polls[i]
+        cnts = self.vote_counts_list[i]
+        answers = valid_answers(p["type"], cnts, answers, p["write_in"])
+        if not answers:
+            return
+        self.forward_web("add_vote", question, answers)
+        for choice in answers:
+            if choice not in p["index"]:
+                # réponse libre tout juste ajoutée au compteur
+                p["index"][choice] = len(p["choices"])
+                p["choices"].append(choice)
+
+        self.ensure_loaded(i)
+        self.last_activity[i] = time.monotonic()
+        p["ballots"] += 1
+        if p["irv"] is not None:
+            p["irv"].add_ballot(answers)
+        timestamp, delay = self.skew.correct(session, sent, received)
+        if delay is not None:
+            self.latencies_list[i].append(delay)
+        if self.start_times[i] is None:
+            self.start_times[i] = timestamp
+        t_rel = timestamp - self.start_times[i]
+        total_ser = self.time_series_total_list[i]
+        if total_ser:
+            # les votes restent ordonnés même si l'estimation du décalage évolue
+            t_rel = max(t_rel, total_ser[-1][0])
+        total_ser.append((t_rel, p["ballots"]))
+        times, cidx, nums = self.vote_logs[i]
+        # pour un classement, les séries suivent les premiers choix
+        voted = counted_choices(p["type"], answers)
+        for choice in voted:
+            n = cnts.increment(choice)
+            self.series_per_choice_list[i].setdefault(choice, []).append((t_rel, n))
+            times.append(t_rel)
+            cidx.append(p["index"][choice])
+            nums.append(p["ballots"])
+        self.versions[i] += 1
+        entry = self.render_cache.get(i)
+        if entry is not None:
+            self.extend_render_entry(i, entry, voted)
+        if getattr(self, "current_idx", None) == i:
+            self.update_ui(i)
 
     def show_results(self, idx):
+        prev = getattr(self, "current_idx", None)
+        if prev is not None and prev != idx:
+            self.snapshot_canvases(prev)
         self.current_idx = idx
+        self.ensure_loaded(idx)
         self.update_ui(idx)
 
+    def series_bytes(self, idx):
+        if self.spilled[idx] is not None:
+            return 0
+        n = len(self.vote_logs[idx][0])
+        return n * (2 * BYTES_PER_POINT + SPILL_DTYPE.itemsize)
+
+    @staticmethod
+    def entry_bytes(entry):
+        """Mémoire estimée d'une entrée du cache de rendu : image et données préparées."""
+        data = entry["data"]
+        points = len(data["total"][0]) if data["total"] else 0
+        points += sum(len(xs) for xs, _ in data["series"].values())
+        return entry["pixel_bytes"] + points * PLOT_BYTES_PER_POINT
+
+    def enforce_retention(self):
+        """Tient la mémoire estimée (séries et cache de rendu) sous MEMORY_BUDGET_MB.
+
+        Au-delà du budget, on libère jusqu'à MEMORY_LOW_WATER du budget : les images en
+        cache d'abord, puis les données préparées, des moins aux plus récentes, et enfin
+        les séries des sondages sans vote depuis SPILL_MIN_IDLE, écrites sur disque. Un
+        sondage qui reçoit encore des votes n'est donc pas écrit puis relu en boucle.
+        Les séries des sondages inactifs depuis IDLE_SECONDS sont écrites sur disque
+        dans tous les cas. Seuls les totaux restent en mémoire."""
+        current = getattr(self, "current_idx", None)
+        now = time.monotonic()
+        budget = MEMORY_BUDGET_MB * 1024 * 1024
+        used = sum(self.series_bytes(i) for i in range(len(self.polls)))
+        used += sum(self.entry_bytes(e) for e in self.render_cache.values())
+        target = budget * MEMORY_LOW_WATER if used > budget else budget
+
+        for idx, entry in self.render_cache.items():
+            if used <= target:
+                break
+            if idx == current or entry["pixels"] is None:
+                continue
+            used -= entry["pixel_bytes"]
+            entry["pixels"]      = None
+            entry["pixel_bytes"] = 0
+
+        for idx in [i for i in self.render_cache if i != current]:
+            if used <= target:
+                break
+            used -= self.entry_bytes(self.render_cache.pop(idx))
+
+        candidates = sorted(
+            (i for i in range(len(self.polls))
+             if i != current and self.spilled[i] is None and self.vote_logs[i][0]),
+            key=lambda i: self.last_activity[i],
+        )
+        for i in candidates:
+            idle = now - self.last_activity[i]
+            if idle < IDLE_SECONDS and (used <= target or idle < SPILL_MIN_IDLE):
+                break
+            used -= self.series_bytes(i)
+            entry = self.render_cache.get(i)
+            if entry is not None:
+                used -= self.entry_bytes(entry)
+            self.spill_poll(i)
+
+    def spill_poll(self, idx):
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        path = os.path.join(SPILL_DIR, f"poll_{os.getpid()}_{idx}.npy")
+        times, cidx, nums = self.vote_logs[idx]
+        rec = np.empty(len(times), dtype=SPILL_DTYPE)
+        rec["t"] = np.frombuffer(times, dtype="f8")
+        rec["c"] = np.frombuffer(cidx, dtype=np.dtype("u%d" % cidx.itemsize))
+        rec["n"] = np.frombuffer(nums, dtype=np.dtype("u%d" % nums.itemsize))
+        np.save(path, rec)
+
+        self.spilled[idx]                = path
+        self.vote_logs[idx]              = None
+        self.time_series_total_list[idx] = None
+        self.series_per_choice_list[idx] = None
+        self.render_cache.pop(idx, None)
+
+    def ensure_loaded(self, idx):
+        """Recharge à la demande les séries d'un sondage écrit sur disque."""
+        path = self.spilled[idx]
+        if path is None:
+            return
+        rec = np.load(path, mmap_mode="r")
+        choices = self.polls[idx]["choices"]
+        running = [0] * len(choices)
+        total = []
+        spc   = {}
+        times = array("d")
+        cidx  = array("I")
+        nums  = array("I")
+        for t, ci, n in zip(rec["t"].tolist(), rec["c"].tolist(), rec["n"].tolist()):
+            running[ci] += 1
+            if not total or total[-1][1] != n:
+                total.append((t, n))
+            spc.setdefault(choices[ci], []).append((t, running[ci]))
+            times.append(t)
+            cidx.append(ci)
+            nums.append(n)
+        del rec
+        os.remove(path)
+
+        self.spilled[idx]                = None
+        self.vote_logs[idx]              = (times, cidx, nums)
+        self.time_series_total_list[idx] = total
+        self.series_per_choice_list[idx] = spc
+
+    def closeEvent(self, event):
+        for path in self.spilled:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        if self.broker_proc is not None:
+            self.broker_proc.terminate()
+        if self.web_loop is not None:
+            self.web_loop.call_soon_threadsafe(self.web_loop.stop)
+        super().closeEvent(event)
+
     def update_ui(self, idx):
-        poll   = self.polls[idx]
-        counts = self.vote_counts_list[idx]
+        poll  = self.polls[idx]
+        entry = self.get_render_entry(idx)
+        data  = entry["data"]
 
         self.question_lbl.setText(poll["question"])
+        lat = self.latencies_list[idx]
+        self.latency_lbl.setText(
+            f"Retard médian de réception (au-delà du minimum) : {statistics.median(lat) * 1000:.1f} ms"
+            if lat else ""
+        )
 
         while self.labels_layout.count():
             it = self.labels_layout.takeAt(0)
@@ -212,20 +525,177 @@ class VoteResults(QWidget):
             if w:
                 w.deleteLater()
 
-        for c, v in counts.items():
+        if data["status"]:
+            lbl = QLabel(data["status"])
+            lbl.setWordWrap(True)
+            lbl.setStyleSheet("QLabel { color:#ffd24d; font-size:16px; font-weight:bold; }")
+            self.labels_layout.addWidget(lbl)
+
+        for c, v in data["counts"]:
             lbl = QLabel(f"{c}: {v} votes")
             lbl.setStyleSheet("QLabel { color:white; font-size:16px; }")
             self.labels_layout.addWidget(lbl)
+        n_others, v_others = data["others"]
+        if n_others:
+            lbl = QLabel(f"Autres ({n_others} choix) : {v_others} votes")
+            lbl.setStyleSheet("QLabel { color:#b8a0d0; font-size:16px; }")
+            self.labels_layout.addWidget(lbl)
         self.labels_layout.addStretch(1)
 
-        self.update_histogram(counts)
-        self.update_pie(counts)
-        self.update_time_total(idx)
-        self.update_time_per_choice(idx)
+        if not self.blit_cached(entry):
+            self.draw_plots(idx, data)
+            self.render_canvases()
+
+    def draw_plots(self, idx, data):
+        self.update_histogram(data["items"])
+        self.update_pie(data["items"])
+        self.update_time_total(data["total"])
+        self.update_time_per_choice(data["per_choice"])
+        self.axes_key = (idx, self.versions[idx])
+
+    def on_canvas_resize(self, event):
+        # Après une recopie depuis le cache, les axes peuvent montrer un autre
+        # sondage : on les reconstruit avant que matplotlib ne redessine.
+        idx = getattr(self, "current_idx", None)
+        if idx is not None and self.axes_key != (idx, self.versions[idx]):
+            self.draw_plots(idx, self.get_render_entry(idx)["data"])
+
+    def get_render_entry(self, idx):
+        """Renvoie les données de tracé du sondage, depuis le cache LRU si elles sont à jour."""
+        entry = self.render_cache.get(idx)
+        if entry is None or entry["version"] != self.versions[idx]:
+            entry = {
+                "version": self.versions[idx],
+                "data":    self.prepare_plot_data(idx),
+                "pixels":  None,
+                "pixel_bytes": 0,
+            }
+            self.render_cache[idx] = entry
+        self.render_cache.move_to_end(idx)
+        while len(self.render_cache) > RENDER_CACHE_SIZE:
+            self.render_cache.popitem(last=False)
+        return entry
+
+    def extend_render_entry(self, idx, entry, voted):
+        """Ajoute le dernier vote aux données en cache au lieu de tout reconstruire.
+
+        L'image mise en cache ne correspond plus au sondage : elle est libérée."""
+        t_rel, n = self.time_series_total_list[idx][-1]
+        data = entry["data"]
+        if data["total"] is None:
+            data["total"] = ([], [])
+        data["total"][0].append(t_rel)
+        data["total"][1].append(n)
+        self.refresh_plot_data(idx, data, voted)
+        entry["version"]     = self.versions[idx]
+        entry["pixels"]      = None
+        entry["pixel_bytes"] = 0
+
+    def prepare_plot_data(self, idx):
+        total = self.time_series_total_list[idx]
+        data = {
+            "total":  ([t for t, _ in total], [n for _, n in total]) if total else None,
+            # choix -> (xs, ys) des courbes des TOP_K premiers choix
+            "series": {},
+        }
+        self.refresh_plot_data(idx, data)
+        return data
+
+    def refresh_plot_data(self, idx, data, voted=()):
+        """Met à jour le résumé et les courbes des TOP_K premiers choix.
+
+        Seules les courbes des choix `voted` reçoivent un point ; les autres
+        sont juste prolongées jusqu'au dernier vote. Une courbe n'est construite
+        en entier que lorsque son choix entre dans les TOP_K premiers."""
+        counts = self.vote_counts_list[idx]
+        top    = counts.top(TOP_K)
+        others = counts.others(TOP_K)
+        total  = self.time_series_total_list[idx]
+        spc    = self.series_per_choice_list[idx]
+        series = data["series"]
+        shown  = {c for c, _ in top}
+        for c in [c for c in series if c not in shown]:
+            del series[c]
+        per_choice = []
+        for c, v in top:
+            ser = spc.get(c)
+            if not ser:
+                continue
+            if c not in series:
+                # les séries sont creuses : on part de 0 et on prolonge jusqu'au dernier vote
+                xs, ys = zip((0, 0), *ser, (total[-1][0], v))
+                series[c] = (list(xs), list(ys))
+            else:
+                xs, ys = series[c]
+                if c in voted:
+                    xs[-1], ys[-1] = ser[-1]
+                    xs.append(total[-1][0])
+                    ys.append(v)
+                else:
+                    xs[-1] = total[-1][0]
+            per_choice.append((c, *series[c]))
+        status = ""
+        irv = self.polls[idx]["irv"]
+        if irv is not None:
+            # vote alternatif : barres et camembert montrent le dernier tour,
+            # les courbes suivent les premiers choix
+            standings = irv.standings()
+            top    = standings[:TOP_K]
+            others = (len(standings[TOP_K:]), sum(v for _, v in standings[TOP_K:]))
+            if irv.winner is not None:
+                status = f"Vainqueur provisoire : {irv.winner} (tour {len(irv.rounds) + 1})"
+            if irv.rounds:
+                status += "\nÉliminés : " + ", ".join(irv.eliminated())
+        items = [(c, v) for c, v in top if v > 0]
+        if others[1] > 0:
+            items.append(("Autres", others[1]))
+        data.update(
+            status=status,
+            counts=top,
+            others=others,
+            items=items,
+            per_choice=per_choice,
+        )
+
+    def canvases(self):
+        return (self.canvas, self.time_canvas, self.choice_canvas)
+
+    def blit_cached(self, entry):
+        """Recopie l'image mise en cache si la taille des canevas n'a pas changé."""
+        pixels = entry["pixels"]
+        sizes = tuple(cv.get_width_height() for cv in self.canvases())
+        if pixels is None or pixels[0] != sizes:
+            return False
+        for cv, region in zip(self.canvases(), pixels[1]):
+            cv.restore_region(region)
+            cv.blit(cv.figure.bbox)
+        self.axes_key = None
+        return True
+
+    def render_canvases(self):
+        for cv in self.canvases():
+            cv.draw()
+
+    def snapshot_canvases(self, idx):
+        """Garde l'image du sondage qu'on quitte, pour la recopier à son retour
+        s'il n'a pas reçu de vote entre-temps."""
+        entry = self.render_cache.get(idx)
+        if not CACHE_RENDER_PIXELS or entry is None or entry["pixels"] is not None:
+            return
+        if self.axes_key != (idx, self.versions[idx]):
+            return
+        entry["pixels"] = (
+            tuple(cv.get_width_height() for cv in self.canvases()),
+            [cv.copy_from_bbox(cv.figure.bbox) for cv in self.canvases()],
+        )
+        # RGBA, en pixels physiques
+        entry["pixel_bytes"] = sum(
+            int(cv.figure.bbox.width) * int(cv.figure.bbox.height) * 4
+            for cv in self.canvases()
+        )
 
-    def update_histogram(self, counts):
+    def update_histogram(self, items):
         self.ax_bar.clear()
-        items = [(c,v) for c,v in counts.items() if v>0]
         if items:
             labels, vals = zip(*items)
             bars = self.ax_bar.bar(labels, vals, color='skyblue')
@@ -240,16 +710,13 @@ class VoteResults(QWidget):
         else:
             self.ax_bar.text(0.5,0.5,"Pas de votes",ha='center',va='center')
             self.ax_bar.set_xticks([]); self.ax_bar.set_yticks([])
-        self.canvas.draw()
 
-    def update_pie(self, counts):
+    def update_pie(self, items):
         """Met à jour le camembert, ou affiche un message sans axes s'il n'y a pas de votes."""
-        choices = [c for c, v in counts.items() if v > 0]
-        votes   = [v for v in counts.values()   if v > 0]
-
         self.ax_pie.clear()
 
-        if choices:
+        if items:
+            choices, votes = zip(*items)
             self.ax_pie.pie(votes, labels=choices, autopct="%1.1f%%")
         else:
             self.ax_pie.text(
@@ -262,14 +729,12 @@ class VoteResults(QWidget):
             self.ax_pie.set_yticks([])
 
         self.ax_pie.set_facecolor("white")
-        self.canvas.draw()
 
 
-    def update_time_total(self, idx):
-        data = self.time_series_total_list[idx]
+    def update_time_total(self, data):
         self.time_ax.clear()
         if data:
-            xs, ys = zip(*data)
+            xs, ys = data
             self.time_ax.step(xs, ys, where='post', label='Total')
             self.time_ax.set_xlabel("s")
             self.time_ax.set_ylabel("Total")
@@ -281,16 +746,12 @@ class VoteResults(QWidget):
                 ha="center", va="center", fontsize=12
             )
             self.time_ax.set_xticks([]); self.time_ax.set_yticks([])
-        self.time_canvas.draw()
 
-    def update_time_per_choice(self, idx):
-        spc = self.series_per_choice_list[idx]
+    def update_time_per_choice(self, per_choice):
         self.choice_ax.clear()
-        for c, ser in spc.items():
-            if ser:
-                xs, ys = zip(*ser)
-                self.choice_ax.step(xs, ys, where="post", label=c)
-        if any(spc.values()):
+        for c, xs, ys in per_choice:
+            self.choice_ax.step(xs, ys, where="post", label=c)
+        if per_choice:
             self.choice_ax.legend(fontsize=8)
             self.choice_ax.set_xlabel("s")
             self.choice_ax.set_ylabel("Votes")
@@ -301,7 +762,6 @@ class VoteResults(QWidget):
                 ha="center", va="center", fontsize=12
             )
             self.choice_ax.set_xticks([]); self.choice_ax.set_yticks([])
-        self.choice_canvas.draw()
 
 
 if __name__ == "__main__":
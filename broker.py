@@ -0,0 +1,331 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+# -------- CONFIG --------
+HOST           = "0.0.0.0"
+PORT           = 1883
+DISCOVERY_PORT = 18830
+DISCOVERY_WAIT = 1.5          # secondes d'attente d'une réponse à la découverte
+MAX_BACKLOG    = 1024 * 1024  # octets en attente chez un abonné avant de le couper
+# ------------------------
+
+DISCOVERY_QUERY = b"VOTINGLIVE?"
+DISCOVERY_REPLY = b"VOTINGLIVE "
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+PUBREC, PUBREL, PUBCOMP           = 5, 6, 7
+SUBSCRIBE, SUBACK                 = 8, 9
+UNSUBSCRIBE, UNSUBACK             = 10, 11
+PINGREQ, PINGRESP, DISCONNECT     = 12, 13, 14
+
+
+def resolve_broker(host, port):
+    """Traduit le réglage VOTINGLIVE_BROKER en adresse : "local" vise ce poste,
+    "auto" cherche un broker VotingLive sur le réseau local."""
+    if host == "local":
+        return "127.0.0.1", port
+    if host == "auto":
+        found = discover_broker()
+        if found is None:
+            raise ConnectionError("Aucun broker VotingLive trouvé sur le réseau local.")
+        return found
+    return host, port
+
+
+def discover_broker(timeout=DISCOVERY_WAIT, discovery_port=DISCOVERY_PORT):
+    """Diffuse une requête UDP et renvoie (hôte, port) du premier broker qui répond."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.settimeout(timeout)
+        for target in ("<broadcast>", "127.0.0.1"):
+            try:
+                sock.sendto(DISCOVERY_QUERY, (target, discovery_port))
+            except OSError:
+                continue
+        try:
+            data, addr = sock.recvfrom(64)
+        except socket.timeout:
+            return None
+    if not data.startswith(DISCOVERY_REPLY):
+        return None
+    return addr[0], int(data[len(DISCOVERY_REPLY):])
+
+
+def start_local_broker(port=PORT, timeout=5.0):
+    """Lance broker.py dans un processus séparé et attend qu'il accepte les connexions."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "broker.py")
+    proc = subprocess.Popen([sys.executable, script, "--port", str(port)])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+    proc.kill()
+    raise ConnectionError(f"Le broker local n'a pas démarré sur le port {port}.")
+
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        n, digit = divmod(n, 128)
+        out.append(digit | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def encode_str(s):
+    b = s.encode()
+    return len(b).to_bytes(2, "big") + b
+
+
+def packet(kind, body, flags=0):
+    return bytes([kind << 4 | flags]) + encode_length(len(body)) + body
+
+
+def topic_matches(filt, topic):
+    f_parts = filt.split("/")
+    t_parts = topic.split("/")
+    for i, f in enumerate(f_parts):
+        if f == "#":
+            return True
+        if i >= len(t_parts) or (f != "+" and f != t_parts[i]):
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+class Reader:
+    """Lecture séquentielle du corps d'un paquet."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos  = 0
+
+    def take(self, n):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def u8(self):
+        return self.take(1)[0]
+
+    def u16(self):
+        return int.from_bytes(self.take(2), "big")
+
+    def string(self):
+        return self.take(self.u16()).decode()
+
+    def varint(self):
+        n, shift = 0, 0
+        while True:
+            b = self.u8()
+            n |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return n
+            shift += 7
+
+    def skip_properties(self):
+        self.take(self.varint())
+
+    def rest(self):
+        return self.data[self.pos:]
+
+
+class Session:
+    def __init__(self, writer):
+        self.writer    = writer
+        self.version   = 4
+        self.client_id = ""
+        self.filters   = set()
+
+    def send(self, data):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_BACKLOG:
+            # abonné trop lent : on le coupe sans attendre que son tampon se vide,
+            # ce qui réveille sa lecture dans Broker.handle et le désabonne
+            transport.abort()
+            return
+        self.writer.write(data)
+
+
+class Broker:
+    """Broker MQTT minimal (3.1.1 et 5) pour le réseau local de l'événement.
+
+    Les abonnements sont accordés en QoS 0 et sans messages retenus : c'est
+    ce dont les applications VotingLive ont besoin. Les publications QoS 1
+    et 2 sont acquittées puis relayées en QoS 0.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}  # filtre -> sessions abonnées
+
+    async def handle(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = Session(writer)
+        keepalive = None
+        try:
+            while True:
+                header, body = await asyncio.wait_for(self.read_packet(reader), keepalive)
+                kind = header >> 4
+                if kind == CONNECT:
+                    keepalive = self.on_connect(session, body)
+                elif kind == PUBLISH:
+                    self.on_publish(session, header, body)
+                elif kind == PUBREL:
+                    session.send(packet(PUBCOMP, body[:2]))
+                elif kind == SUBSCRIBE:
+                    self.on_subscribe(session, body)
+                elif kind == UNSUBSCRIBE:
+                    self.on_unsubscribe(session, body)
+                elif kind == PINGREQ:
+                    session.send(packet(PINGRESP, b""))
+                elif kind == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                ConnectionError, IndexError, UnicodeDecodeError):
+            pass
+        finally:
+            for filt in session.filters:
+                subs = self.subscriptions.get(filt)
+                if subs is not None:
+                    subs.discard(session)
+                    if not subs:
+                        del self.subscriptions[filt]
+            writer.close()
+
+    async def read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            length |= (b & 0x7F) << shift
+            if not b & 0x80:
+                break
+            shift += 7
+        return header, await reader.readexactly(length)
+
+    def on_connect(self, session, body):
+        r = Reader(body)
+        r.string()                      # "MQTT" ou "MQIsdp"
+        session.version = r.u8()
+        r.u8()                          # drapeaux de connexion
+        keepalive = r.u16()
+        if session.version == 5:
+            r.skip_properties()
+        session.client_id = r.string()
+        if session.version == 5:
+            session.send(packet(CONNACK, b"\x00\x00\x00"))
+        else:
+            session.send(packet(CONNACK, b"\x00\x00"))
+        return keepalive * 1.5 if keepalive else None
+
+    def on_publish(self, session, header, body):
+        qos = (header >> 1) & 0x03
+        r = Reader(body)
+        topic = r.string()
+        if qos:
+            pid = r.take(2)
+        if session.version == 5:
+            r.skip_properties()
+        payload = r.rest()
+
+        if qos == 1:
+            session.send(packet(PUBACK, pid))
+        elif qos == 2:
+            session.send(packet(PUBREC, pid))
+
+        # une seule copie par abonné, même si plusieurs de ses filtres correspondent
+        targets = set()
+        for filt, subs in self.subscriptions.items():
+            if topic_matches(filt, topic):
+                targets.update(subs)
+        head = encode_str(topic)
+        for s in targets:
+            props = b"\x00" if s.version == 5 else b""
+            s.send(packet(PUBLISH, head + props + payload))
+
+    def on_subscribe(self, session, body):
+        r = Reader(body)
+        pid = r.take(2)
+        if session.version == 5:
+            r.skip_properties()
+        granted = bytearray()
+        while r.pos < len(body):
+            filt = r.string()
+            r.u8()                      # QoS demandée : on accorde 0
+            self.subscriptions.setdefault(filt, set()).add(session)
+            session.filters.add(filt)
+            granted.append(0)
+        props = b"\x00" if session.version == 5 else b""
+        session.send(packet(SUBACK, pid + props + bytes(granted)))
+
+    def on_unsubscribe(self, session, body):
+        r = Reader(body)
+        pid = r.take(2)
+        if session.version == 5:
+            r.skip_properties()
+        count = 0
+        while r.pos < len(body):
+            filt = r.string()
+            subs = self.subscriptions.get(filt)
+            if subs is not None:
+                subs.discard(session)
+                if not subs:
+                    del self.subscriptions[filt]
+            session.filters.discard(filt)
+            count += 1
+        if session.version == 5:
+            session.send(packet(UNSUBACK, pid + b"\x00" + bytes(count)))
+        else:
+            session.send(packet(UNSUBACK, pid))
+
+
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    def __init__(self, port):
+        self.port = port
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data.strip() == DISCOVERY_QUERY:
+            self.transport.sendto(DISCOVERY_REPLY + str(self.port).encode(), addr)
+
+
+async def main(host, port, discovery_port):
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(Broker().handle, host, port)
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: DiscoveryResponder(port), local_addr=("0.0.0.0", discovery_port),
+        allow_broadcast=True,
+    )
+    print(f"Broker local en écoute sur {host}:{port} (découverte UDP {discovery_port})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker MQTT local VotingLive")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--discovery-port", type=int, default=DISCOVERY_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port, args.discovery_port))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,21 +1,26 @@
+import os
 import sys
 import json
+import time
 import traceback
+import uuid
 from functools import partial
-from datetime import datetime
 import paho.mqtt.client as mqtt
+from broker import resolve_broker
+from tally import TopKCounter, valid_answers, counted_choices
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel,
     QPushButton, QMessageBox, QGridLayout, QLineEdit,
-    QScrollArea
+    QScrollArea, QCompleter
 )
 
 # -------- CONFIGURATION --------
-BROKER         = "broker.hivemq.com"
-PORT           = 1883
+BROKER         = os.environ.get("VOTINGLIVE_BROKER", "broker.hivemq.com")  # hôte, "local" ou "auto"
+PORT           = int(os.environ.get("VOTINGLIVE_PORT", 1883))
 TOPIC_QUESTION = "votinglivepoll/question"
 TOPIC_VOTE     = "votinglivepoll/vote"
+GRID_LIMIT     = 30  # au-delà, la réponse se tape avec autocomplétion
 # ---------------------------------
 
 class WelcomeWindow(QWidget):
@@ -63,15 +68,22 @@ class WelcomeWindow(QWidget):
 
 class VotingClient(QWidget):
     question_signal = pyqtSignal(int, str, list)
+    vote_signal     = pyqtSignal(str, object)
 
     def __init__(self, pseudo):
         super().__init__()
         self.pseudo = pseudo
+        # identifie cet appareil : plusieurs personnes peuvent avoir le même pseudo
+        self.session_id = uuid.uuid4().hex
         self.polls = []
         self.voted_polls = set()
         self.current_poll_idx = None
 
         self.vote_counts = {}
+        self.write_in_questions = set()
+        self.poll_types = {}
+        self.selection = []
+        self.choice_buttons = {}
 
         self.setWindowTitle(f"Sondage live — {pseudo}")
         self.resize(800, 600)
@@ -108,6 +120,8 @@ class VotingClient(QWidget):
         self.main_layout.addWidget(self.scroll_area)
 
         self.question_signal.connect(self.handle_question)
+        # les votes reçus sont comptés dans le thread de l'interface, comme les nôtres
+        self.vote_signal.connect(self.count_vote)
 
         self.start_mqtt()
 
@@ -117,7 +131,7 @@ class VotingClient(QWidget):
         self.client = mqtt.Client()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
-        self.client.connect(BROKER, PORT)
+        self.client.connect(*resolve_broker(BROKER, PORT))
         self.client.loop_start()
 
     def on_connect(self, client, userdata, flags, rc):
@@ -129,16 +143,33 @@ class VotingClient(QWidget):
         if msg.topic == TOPIC_QUESTION:
             question = data["question"]
             choices  = data["choices"]
-            self.vote_counts[question] = {c: 0 for c in choices}
+            self.vote_counts[question] = TopKCounter(choices)
+            if data.get("write_in"):
+                self.write_in_questions.add(question)
+            self.poll_types[question] = data.get("type", "single")
             idx = len(self.polls)
             self.polls.append((question, choices))
             self.question_signal.emit(idx, question, choices)
 
         elif msg.topic == TOPIC_VOTE:
-            q = data.get("question")
-            r = data.get("reponse")
-            if q in self.vote_counts and r in self.vote_counts[q]:
-                self.vote_counts[q][r] += 1
+            self.vote_signal.emit(data.get("question") or "", data.get("reponse"))
+
+    def count_vote(self, question, answer):
+        """Compte un bulletin avec les mêmes règles que l'admin (voir tally.py) et
+        renvoie les choix comptés : chaque case pour les choix multiples, le premier
+        choix pour un classement."""
+        counts = self.vote_counts.get(question)
+        if counts is None:
+            return []
+        kind = self.poll_types.get(question, "single")
+        answers = valid_answers(
+            kind, counts, answer if isinstance(answer, list) else [answer],
+            question in self.write_in_questions,
+        )
+        counted = counted_choices(kind, answers)
+        for c in counted:
+            counts.increment(c)
+        return counted
 
     def handle_question(self, idx, question, choices):
         self.current_poll_idx = idx
@@ -154,6 +185,13 @@ class VotingClient(QWidget):
             self.grid.removeWidget(b)
             b.deleteLater()
         self.buttons.clear()
+        self.selection = []
+        self.choice_buttons = {}
+
+        kind = self.poll_types.get(question, "single")
+        if kind == "single" and (len(choices) > GRID_LIMIT or question in self.write_in_questions):
+            self.add_answer_input(question, choices, already_voted)
+            return
 
         for i, text in enumerate(choices):
             btn = QPushButton(f"{chr(65 + i)}. {text}")
@@ -165,37 +203,119 @@ class VotingClient(QWidget):
                 " QPushButton:hover { background-color:#330066; }"
             )
             btn.setEnabled(not already_voted)
-            btn.clicked.connect(partial(self.send_vote, text))
+            if kind == "single":
+                btn.clicked.connect(partial(self.send_vote, text))
+            else:
+                btn.setCheckable(True)
+                btn.setStyleSheet(btn.styleSheet() + " QPushButton:checked { background-color:#8f00ff; }")
+                btn.clicked.connect(partial(self.toggle_choice, text, kind))
+                self.choice_buttons[text] = (btn, f"{chr(65 + i)}. {text}")
             self.buttons.append(btn)
             row, col = divmod(i, 2)
             self.grid.addWidget(btn, row, col)
 
+        if kind != "single":
+            submit = QPushButton("Valider mon classement" if kind == "ranked" else "Valider mes choix")
+            submit.setMinimumHeight(60)
+            submit.setStyleSheet(
+                "QPushButton { background-color:#8f00ff; color:white;"
+                " border-radius:12px; font-size:18px; font-weight:bold; }"
+                " QPushButton:hover { background-color:#aa33ff; }"
+            )
+            submit.setEnabled(not already_voted)
+            submit.clicked.connect(self.submit_selection)
+            self.buttons.append(submit)
+            self.grid.addWidget(submit, (len(choices) + 1) // 2, 0, 1, 2)
+
+    def toggle_choice(self, text, kind):
+        if text in self.selection:
+            self.selection.remove(text)
+        else:
+            self.selection.append(text)
+        if kind == "ranked":
+            # le rang s'affiche dans l'ordre des clics
+            for choice, (btn, label) in self.choice_buttons.items():
+                if choice in self.selection:
+                    btn.setText(f"{self.selection.index(choice) + 1}. {choice}")
+                else:
+                    btn.setText(label)
+        for choice, (btn, _) in self.choice_buttons.items():
+            btn.setChecked(choice in self.selection)
+
+    def submit_selection(self):
+        if not self.selection:
+            QMessageBox.warning(self, "Erreur", "Sélectionnez au moins une réponse.")
+            return
+        self.send_vote(list(self.selection))
+
+    def add_answer_input(self, question, choices, already_voted):
+        field = QLineEdit()
+        field.setPlaceholderText("Tapez votre réponse…")
+        field.setMinimumHeight(60)
+        field.setStyleSheet(
+            "QLineEdit { background-color:#1a0033; color:white;"
+            " border:3px solid #9b4dff; border-radius:12px;"
+            " font-size:18px; padding:8px; }"
+        )
+        completer = QCompleter(choices, field)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setFilterMode(Qt.MatchContains)
+        field.setCompleter(completer)
+        field.setEnabled(not already_voted)
+
+        btn = QPushButton("Voter")
+        btn.setMinimumHeight(60)
+        btn.setStyleSheet(
+            "QPushButton { background-color:#8f00ff; color:white;"
+            " border-radius:12px; font-size:18px; font-weight:bold; }"
+            " QPushButton:hover { background-color:#aa33ff; }"
+        )
+        btn.setEnabled(not already_voted)
+
+        submit = partial(self.send_typed_vote, field, question, choices)
+        btn.clicked.connect(submit)
+        field.returnPressed.connect(submit)
+
+        self.buttons.extend([field, btn])
+        self.grid.addWidget(field, 0, 0)
+        self.grid.addWidget(btn, 0, 1)
+
+    def send_typed_vote(self, field, question, choices):
+        text = field.text().strip()
+        if text in choices or (text and question in self.write_in_questions):
+            self.send_vote(text)
+        else:
+            QMessageBox.warning(self, "Erreur", "Choisissez une réponse proposée.")
+
     def send_vote(self, choice):
         idx = self.current_poll_idx
         if idx in self.voted_polls:
             return
-        timestamp = int(datetime.now().timestamp())
+        timestamp = round(time.time(), 6)
         question = self.lbl_question.text()
 
         payload = json.dumps({
             "pseudo":   self.pseudo,
+            "session":  self.session_id,
             "question": question,
             "reponse":  choice,
             "timestamp": timestamp
         })
         self.client.publish(TOPIC_VOTE, payload)
 
-        self.vote_counts[question][choice] += 1
-        total = sum(self.vote_counts[question].values())
-        pct   = self.vote_counts[question][choice] / total * 100
+        counted = self.count_vote(question, choice)
+        kind = self.poll_types.get(question, "single")
+        text = "Votre vote a été enregistré !"
+        if kind != "multi" and counted:
+            counts = self.vote_counts[question]
+            pct    = counts[counted[0]] / counts.total * 100
+            same   = "placé la même réponse en tête" if kind == "ranked" else "choisi la même réponse"
+            text += f"\n\n{pct:.1f}% des votants ont {same}."
 
         msg = QMessageBox(self)
         msg.setIcon(QMessageBox.Information)
         msg.setWindowTitle("Succès")
-        msg.setText(
-            f"Votre vote a été enregistré !\n\n"
-            f"{pct:.1f}% des votants ont choisi la même réponse."
-        )
+        msg.setText(text)
         msg.setStyleSheet(
             "QLabel { color: white; }"
             "QPushButton { color: white; background-color: #8f00ff;"
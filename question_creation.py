@@ -1,3 +1,4 @@
+import os
 import json
 import sys
 import paho.mqtt.client as paho
@@ -5,10 +6,22 @@ from paho import mqtt
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLineEdit, QLabel, QFrame,
     QPushButton, QMessageBox, QSpacerItem, QSizePolicy, QScrollArea,
-    QComboBox, QHBoxLayout
+    QComboBox, QHBoxLayout, QPlainTextEdit, QCheckBox
 )
 from PyQt5.QtGui import QFont, QPalette, QColor, QIntValidator
 from PyQt5.QtCore import Qt
+from broker import resolve_broker
+
+BROKER = os.environ.get("VOTINGLIVE_BROKER", "broker.hivemq.com")  # hôte, "local" ou "auto"
+PORT   = int(os.environ.get("VOTINGLIVE_PORT", 1883))
+
+MAX_FIELDS  = 30    # au-delà, les choix se saisissent en liste, un par ligne
+MAX_CHOICES = 5000  # choix proposés à la création (voir tally.MAX_TALLIED_CHOICES pour le décompte)
+POLL_TYPES  = [
+    ("Choix unique", "single"),
+    ("Choix multiples", "multi"),
+    ("Classement (vote alternatif)", "ranked"),
+]
 
 
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -20,7 +33,7 @@ def on_publish(client, userdata, mid, properties=None):
 client = paho.Client(client_id="", userdata=None, protocol=paho.MQTTv5)
 client.on_connect = on_connect
 client.on_publish = on_publish  
-client.connect("broker.hivemq.com", 1883)
+client.connect(*resolve_broker(BROKER, PORT))
 client.loop_start()
 
 class QuestionCreator(QWidget):
@@ -34,6 +47,7 @@ class QuestionCreator(QWidget):
         self.published_questions = set()
 
         self.choices_inputs = []
+        self.choices_list   = None
         self.init_ui()
         self.show()
 
@@ -62,13 +76,35 @@ class QuestionCreator(QWidget):
         # Champ question
         self.question_input = self.add_input(self.layout, "Entrez la question...")
 
+        # Type de sondage
+        type_layout = QHBoxLayout()
+        label_type = QLabel("Type de sondage :")
+        label_type.setStyleSheet("color: white; font-size: 16px;")
+        self.type_input = QComboBox()
+        for label, kind in POLL_TYPES:
+            self.type_input.addItem(label, kind)
+        self.type_input.setStyleSheet("""
+            QComboBox {
+                background-color: #2e0055;
+                color: white;
+                font-size: 16px;
+                padding: 8px;
+                border: 2px solid #8f00ff;
+                border-radius: 8px;
+            }
+        """)
+        self.type_input.currentIndexChanged.connect(self.on_type_change)
+        type_layout.addWidget(label_type)
+        type_layout.addWidget(self.type_input)
+        self.layout.addLayout(type_layout)
+
         # Combo box pour le nombre de choix
         count_layout = QHBoxLayout()
-        label_count = QLabel("Nombre de choix (2-30) :")
+        label_count = QLabel(f"Nombre de choix (2-{MAX_CHOICES}) :")
         label_count.setStyleSheet("color: white; font-size: 16px;")
 
         self.choice_count_input = QLineEdit()
-        self.choice_count_input.setValidator(QIntValidator(2, 30))
+        self.choice_count_input.setValidator(QIntValidator(2, MAX_CHOICES))
         self.choice_count_input.setPlaceholderText("Ex : 4")
         self.choice_count_input.setStyleSheet("""
             QLineEdit {
@@ -96,6 +132,10 @@ class QuestionCreator(QWidget):
         # Init avec 4 choix par défaut
         self.update_choice_fields(4)
 
+        self.write_in_check = QCheckBox("Autoriser les réponses libres")
+        self.write_in_check.setStyleSheet("color: white; font-size: 16px;")
+        self.layout.addWidget(self.write_in_check)
+
         # Bouton publier
         send_btn = QPushButton("Publier la question")
         send_btn.setMinimumHeight(50)
@@ -146,6 +186,25 @@ class QuestionCreator(QWidget):
                 widget.deleteLater()
 
         self.choices_inputs = []
+        self.choices_list   = None
+
+        if count > MAX_FIELDS:
+            self.choices_list = QPlainTextEdit()
+            self.choices_list.setPlaceholderText(f"Un choix par ligne ({count} attendus)")
+            self.choices_list.setMinimumHeight(250)
+            self.choices_list.setStyleSheet("""
+                QPlainTextEdit {
+                    background-color: #2e0055;
+                    color: white;
+                    border: 2px solid #8f00ff;
+                    border-radius: 10px;
+                    padding: 10px;
+                    font-size: 16px;
+                }
+            """)
+            self.choices_container.addWidget(self.choices_list)
+            self.expected_count = count
+            return
 
         for i in range(count):
             field = QLineEdit()
@@ -170,19 +229,56 @@ class QuestionCreator(QWidget):
         text = self.choice_count_input.text()
         if text.isdigit():
             count = int(text)
-            if 2 <= count <= 30:
+            if 2 <= count <= MAX_CHOICES:
                 self.update_choice_fields(count)
 
+    def on_type_change(self):
+        # Les réponses libres ne valent que pour les sondages à choix unique
+        single = self.type_input.currentData() == "single"
+        self.write_in_check.setEnabled(single)
+        if not single:
+            self.write_in_check.setChecked(False)
+
     def publish_question(self):
         question = self.question_input.text().strip()
-        choices = [c.text().strip() for c in self.choices_inputs]
+        kind = self.type_input.currentData()
+        if self.choices_list is not None:
+            lines = self.choices_list.toPlainText().splitlines()
+            choices = [c.strip() for c in lines if c.strip()]
+            complete = len(choices) == self.expected_count
+        else:
+            choices = [c.text().strip() for c in self.choices_inputs]
+            complete = all(choices)
 
         # Vérifier remplissage
-        if not question or any(not c for c in choices):
+        if not question or not complete or len(set(choices)) != len(choices):
+            msg = QMessageBox(self)
+            msg.setIcon(QMessageBox.Warning)
+            msg.setWindowTitle("Erreur")
+            msg.setText("Veuillez remplir tous les champs, sans choix en double.")
+            msg.setStyleSheet("""
+                QLabel { color: white; }
+                QPushButton {
+                    color: white;
+                    background-color: #8f00ff;
+                    border-radius: 6px;
+                    padding: 6px 12px;
+                }
+                QPushButton:hover {
+                    background-color: #b84dff;
+                }
+            """)
+            msg.exec_()
+            return
+
+        # Les bulletins à plusieurs réponses se remplissent avec des boutons
+        if kind != "single" and len(choices) > MAX_FIELDS:
             msg = QMessageBox(self)
             msg.setIcon(QMessageBox.Warning)
             msg.setWindowTitle("Erreur")
-            msg.setText("Veuillez remplir tous les champs.")
+            msg.setText(
+                f"Les sondages à choix multiples ou à classement sont limités à {MAX_FIELDS} choix."
+            )
             msg.setStyleSheet("""
                 QLabel { color: white; }
                 QPushButton {
@@ -220,7 +316,12 @@ class QuestionCreator(QWidget):
             return
 
         # Publication
-        message = json.dumps({"question": question, "choices": choices})
+        message = json.dumps({
+            "question": question,
+            "choices":  choices,
+            "type":     kind,
+            "write_in": self.write_in_check.isChecked(),
+        })
         client.publish("votinglivepoll/question", message, qos=1)
 
         # Marquer comme publié
@@ -250,6 +351,8 @@ class QuestionCreator(QWidget):
         self.question_input.clear()
         for c in self.choices_inputs:
             c.clear()
+        if self.choices_list is not None:
+            self.choices_list.clear()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
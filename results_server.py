@@ -0,0 +1,364 @@
+import csv
+import io
+import os
+import sys
+import json
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+import paho.mqtt.client as mqtt
+from tally import TopKCounter, InstantRunoff, TOP_K, valid_answers, counted_choices
+from broker import resolve_broker
+
+# -------- CONFIG --------
+BROKER         = os.environ.get("VOTINGLIVE_BROKER", "broker.hivemq.com")  # hôte, "local" ou "auto"
+PORT           = int(os.environ.get("VOTINGLIVE_PORT", 1883))
+TOPIC_VOTE     = "votinglivepoll/vote"
+TOPIC_QUESTION = "votinglivepoll/question"
+HTTP_HOST      = "0.0.0.0"
+HTTP_PORT      = 8080
+SSE_MAX_RATE   = 4    # événements par seconde et par connexion, au plus
+SSE_KEEPALIVE  = 15   # secondes sans changement avant un commentaire de maintien
+DELTA_HISTORY  = 1024 # bulletins récents gardés pour les deltas SSE
+# ------------------------
+
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed",
+}
+
+SSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
+class ResultsState:
+    """Décomptes des sondages servis en HTTP.
+
+    Alimenté soit par une souscription MQTT (serveur lancé seul), soit par
+    l'admin qui y relaie ses sondages et ses votes. Toutes les méthodes
+    s'exécutent dans la boucle asyncio du serveur.
+    """
+
+    def __init__(self):
+        self.polls       = []
+        self.by_question = {}
+        self.changed     = []
+        self.list_version = 0
+
+    def on_message(self, topic, payload):
+        try:
+            data = json.loads(payload.decode())
+        except ValueError:
+            return
+        if topic == TOPIC_QUESTION:
+            self.add_poll(data.get("question", ""), data.get("choices", []),
+                          bool(data.get("write_in", False)), data.get("type", "single"))
+        else:
+            ans = data.get("reponse", "")
+            self.add_vote(data.get("question", ""), ans if isinstance(ans, list) else [ans])
+
+    def add_poll(self, question, choices, write_in=False, kind="single",
+                 tally=None, irv=None, ballots=0):
+        """Ajoute un sondage ; `tally`, `irv` et `ballots` reprennent un décompte
+        déjà commencé (sondages antérieurs au lancement du serveur par l'admin)."""
+        idx = len(self.polls)
+        if tally is None:
+            tally = TopKCounter(choices)
+        if irv is None and kind == "ranked":
+            irv = InstantRunoff(choices)
+        self.polls.append({
+            "question": question,
+            "choices":  choices,
+            "type":     kind,
+            "write_in": write_in and kind == "single",
+            "tally":    tally,
+            "irv":      irv,
+            "version":  ballots,
+            # (version, choix comptés) des derniers bulletins, pour les deltas SSE
+            "recent":   deque(maxlen=DELTA_HISTORY),
+        })
+        self.by_question.setdefault(question, idx)
+        self.changed.append(asyncio.Event())
+        self.list_version += 1
+
+    def add_vote(self, question, answers):
+        idx = self.by_question.get(question)
+        if idx is None:
+            return
+        poll  = self.polls[idx]
+        tally = poll["tally"]
+        answers = valid_answers(poll["type"], tally, answers, poll["write_in"])
+        if not answers:
+            return
+
+        if poll["irv"] is not None:
+            poll["irv"].add_ballot(answers)
+        answers = counted_choices(poll["type"], answers)
+        for choice in answers:
+            tally.increment(choice)
+        poll["version"] += 1
+        poll["recent"].append((poll["version"], answers))
+        self.list_version += 1
+        # Réveille les flux SSE de ce sondage, puis arme un nouvel événement.
+        self.changed[idx].set()
+        self.changed[idx] = asyncio.Event()
+
+    def version(self, idx):
+        return self.polls[idx]["version"]
+
+    def runoff(self, idx):
+        irv = self.polls[idx]["irv"]
+        if irv is None:
+            return None
+        return {
+            "winner":     irv.winner,
+            "round":      len(irv.rounds) + 1,
+            "eliminated": irv.eliminated(),
+            "standings":  irv.standings(),
+        }
+
+    def summary(self):
+        return [
+            {"id": i, "question": p["question"], "total": p["tally"].total,
+             "version": self.version(i)}
+            for i, p in enumerate(self.polls)
+        ]
+
+    def snapshot(self, idx):
+        p = self.polls[idx]
+        n_others, v_others = p["tally"].others(TOP_K)
+        return {
+            "id":       idx,
+            "question": p["question"],
+            "type":     p["type"],
+            "counts":   dict(p["tally"].counts),
+            "top":      p["tally"].top(TOP_K),
+            "others":   {"choices": n_others, "votes": v_others},
+            "total":    p["tally"].total,
+            "ballots":  self.version(idx),
+            "version":  self.version(idx),
+            "runoff":   self.runoff(idx),
+        }
+
+    def delta(self, idx, since):
+        """Décomptes des choix votés depuis la version `since`, ou None si ces
+        bulletins ne sont plus dans l'historique récent."""
+        p = self.polls[idx]
+        recent = p["recent"]
+        if p["version"] > since and (not recent or recent[0][0] > since + 1):
+            return None
+        counts = p["tally"].counts
+        delta = {}
+        for version, ballot in reversed(recent):
+            if version <= since:
+                break
+            for c in ballot:
+                delta[c] = counts[c]
+        return delta
+
+    def to_csv(self, idx):
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(["choix", "votes"])
+        for c, v in self.polls[idx]["tally"].counts.items():
+            w.writerow([c, v])
+        return buf.getvalue()
+
+
+class ResultsServer:
+    def __init__(self, state):
+        self.state = state
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request.decode("latin-1").split()
+            if len(parts) != 3:
+                await self.respond(writer, 400, b"")
+                return
+            method, target, _ = parts
+            if method not in ("GET", "HEAD"):
+                await self.respond(writer, 405, b"", {"Allow": "GET, HEAD"})
+                return
+            await self.route(writer, method, urlsplit(target).path, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, path, headers):
+        segs = [s for s in path.split("/") if s]
+        if not segs or segs == ["polls"]:
+            etag = f'W/"l{self.state.list_version}"'
+            body = json.dumps(self.state.summary()).encode()
+            await self.respond_cached(writer, method, headers, etag, body, "application/json")
+            return
+
+        if segs[0] != "polls" or len(segs) > 3:
+            await self.respond(writer, 404, b"")
+            return
+        name, _, ext = segs[1].partition(".")
+        if not name.isdigit() or int(name) >= len(self.state.polls):
+            await self.respond(writer, 404, b"")
+            return
+        idx = int(name)
+
+        if len(segs) == 3:
+            if segs[2] != "events" or ext:
+                await self.respond(writer, 404, b"")
+                return
+            if method == "HEAD":
+                writer.write(SSE_HEAD)
+                await writer.drain()
+                return
+            await self.stream(writer, idx)
+            return
+
+        etag = f'W/"{idx}-{self.state.version(idx)}"'
+        if ext in ("", "json"):
+            body = json.dumps(self.state.snapshot(idx)).encode()
+            ctype = "application/json"
+        elif ext == "csv":
+            body = self.state.to_csv(idx).encode()
+            ctype = "text/csv; charset=utf-8"
+        else:
+            await self.respond(writer, 404, b"")
+            return
+        await self.respond_cached(writer, method, headers, etag, body, ctype)
+
+    async def respond_cached(self, writer, method, headers, etag, body, ctype):
+        extra = {"ETag": etag, "Cache-Control": "no-cache"}
+        if headers.get("if-none-match") == etag:
+            await self.respond(writer, 304, b"", extra)
+            return
+        extra["Content-Type"] = ctype
+        await self.respond(writer, 200, b"" if method == "HEAD" else body, extra,
+                           length=len(body))
+
+    async def respond(self, writer, status, body, extra=None, length=None):
+        head = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            f"Content-Length: {len(body) if length is None else length}",
+            "Access-Control-Allow-Origin: *",
+            "Connection: close",
+        ]
+        for k, v in (extra or {}).items():
+            head.append(f"{k}: {v}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def stream(self, writer, idx):
+        """Flux SSE : un instantané complet, puis seulement les décomptes modifiés,
+        regroupés pour ne pas dépasser SSE_MAX_RATE événements par seconde."""
+        writer.write(SSE_HEAD)
+        snap = self.state.snapshot(idx)
+        version = snap["version"]
+        writer.write(self.event("snapshot", version, snap))
+        await writer.drain()
+
+        interval = 1.0 / SSE_MAX_RATE
+        while True:
+            if self.state.version(idx) == version:
+                try:
+                    await asyncio.wait_for(self.state.changed[idx].wait(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                continue
+
+            delta = self.state.delta(idx, version)
+            if delta is None:
+                # flux trop en retard sur l'historique : on renvoie tout
+                snap = self.state.snapshot(idx)
+                version = snap["version"]
+                writer.write(self.event("snapshot", version, snap))
+                await writer.drain()
+                await asyncio.sleep(interval)
+                continue
+            version = self.state.version(idx)
+            msg = {
+                "version": version,
+                "total":   self.state.polls[idx]["tally"].total,
+                "ballots": version,
+                "counts":  delta,
+            }
+            runoff = self.state.runoff(idx)
+            if runoff is not None:
+                msg["runoff"] = runoff
+            writer.write(self.event("delta", version, msg))
+            await writer.drain()
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def event(name, version, data):
+        return (
+            f"id: {version}\nevent: {name}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+        ).encode()
+
+
+def start_mqtt(loop, state):
+    client = mqtt.Client()
+    client.on_connect = lambda c, u, f, rc: c.subscribe(
+        [(TOPIC_QUESTION, 0), (TOPIC_VOTE, 0)]
+    )
+    client.on_message = lambda c, u, msg: loop.call_soon_threadsafe(
+        state.on_message, msg.topic, msg.payload
+    )
+    client.connect(*resolve_broker(BROKER, PORT))
+    client.loop_start()
+    return client
+
+
+def serve_in_thread(state, host=HTTP_HOST, port=HTTP_PORT):
+    """Démarre le serveur HTTP dans un thread dédié et renvoie sa boucle asyncio.
+
+    L'écoute est ouverte avant de rendre la main : un port déjà pris lève
+    OSError chez l'appelant. Les mises à jour de `state` se font ensuite avec
+    `loop.call_soon_threadsafe`.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            asyncio.start_server(ResultsServer(state).handle, host, port)
+        )
+    except OSError:
+        loop.close()
+        raise
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+async def main():
+    state  = ResultsState()
+    client = start_mqtt(asyncio.get_running_loop(), state)
+    server = await asyncio.start_server(
+        ResultsServer(state).handle, HTTP_HOST, HTTP_PORT
+    )
+    print(f"Résultats disponibles sur http://{HTTP_HOST}:{HTTP_PORT}/polls")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        client.loop_stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,219 @@
+TOP_K               = 10     # choix affichés, les autres sont regroupés
+MAX_TALLIED_CHOICES = 10000  # choix suivis au plus par sondage, réponses libres comprises
+WRITE_IN_MAX_LEN    = 80
+
+
+def valid_answers(kind, counter, answers, write_in=False):
+    """Réponses retenues d'un bulletin, dans l'ordre, selon le type de sondage.
+
+    Pour un choix unique, seule la première réponse compte : si elle n'est pas
+    proposée et que le sondage accepte les réponses libres, elle est nettoyée
+    puis ajoutée au compteur. Renvoie une liste vide si le bulletin est rejeté.
+    """
+    answers = [a for a in answers if isinstance(a, str)]
+    if kind != "single":
+        return list(dict.fromkeys(a for a in answers if a in counter))
+    if not answers:
+        return []
+    choice = answers[0]
+    if choice not in counter:
+        choice = choice.strip()[:WRITE_IN_MAX_LEN]
+        if not (write_in and choice and len(counter) < MAX_TALLIED_CHOICES):
+            return []
+        counter.add(choice)
+    return [choice]
+
+
+def counted_choices(kind, answers):
+    """Choix incrémentés dans le décompte simple : le premier seulement pour un classement."""
+    return answers[:1] if kind == "ranked" else answers
+
+
+class TopKCounter:
+    """Décomptes gardés triés par ordre décroissant.
+
+    `order` contient les choix du plus au moins voté et `first[n]` la première
+    position occupée par un choix à n votes. Un vote échange le choix avec la
+    tête de son groupe puis le fait passer dans le groupe supérieur : le coût
+    ne dépend pas du nombre de choix, et les K premiers sont `order[:K]`.
+    """
+
+    def __init__(self, choices=()):
+        self.order  = []
+        self.pos    = {}
+        self.counts = {}
+        self.first  = {}
+        self.total  = 0
+        for c in choices:
+            self.add(c)
+
+    def __contains__(self, choice):
+        return choice in self.counts
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, choice):
+        return self.counts[choice]
+
+    def add(self, choice):
+        """Ajoute un choix à zéro vote (réponse libre par exemple)."""
+        if choice in self.counts:
+            return
+        self.first.setdefault(0, len(self.order))
+        self.pos[choice] = len(self.order)
+        self.order.append(choice)
+        self.counts[choice] = 0
+
+    def increment(self, choice):
+        n    = self.counts[choice]
+        p    = self.pos[choice]
+        head = self.first[n]
+        if p != head:
+            other = self.order[head]
+            self.order[head], self.order[p] = choice, other
+            self.pos[choice], self.pos[other] = head, p
+
+        nxt = head + 1
+        if nxt < len(self.order) and self.counts[self.order[nxt]] == n:
+            self.first[n] = nxt
+        else:
+            del self.first[n]
+        self.first.setdefault(n + 1, head)
+
+        self.counts[choice] = n + 1
+        self.total += 1
+        return n + 1
+
+    def top(self, k):
+        return [(c, self.counts[c]) for c in self.order[:k]]
+
+    def others(self, k):
+        """Renvoie (nombre de choix, votes) hors des K premiers."""
+        return max(len(self.order) - k, 0), self.total - sum(v for _, v in self.top(k))
+
+
+class InstantRunoff:
+    """Dépouillement par vote alternatif, mis à jour bulletin par bulletin.
+
+    Les bulletins identiques sont regroupés et rangés sous le candidat qu'ils
+    soutiennent au tour courant. Chaque tour garde ses décomptes et le groupe
+    qu'il a transféré : un nouveau bulletin met à jour ces décomptes, et seuls
+    les tours dont l'issue change sont annulés puis rejoués, en ne déplaçant
+    que les groupes des candidats concernés.
+
+    À égalité, le candidat éliminé est celui listé en dernier.
+    """
+
+    def __init__(self, candidates):
+        self.candidates = list(candidates)
+        self.rank       = {c: i for i, c in enumerate(self.candidates)}
+        self.piles      = {c: {} for c in self.candidates}
+        self.tallies    = {c: 0 for c in self.candidates}
+        self.exhausted  = 0
+        self.ballots    = 0
+        self.rounds     = []
+        self.elim_round = {}
+        self.winner     = None
+
+    def holder(self, ballot, r):
+        """Candidat soutenu par le bulletin au tour r, None s'il est épuisé."""
+        for c in ballot:
+            if self.elim_round.get(c, r) >= r:
+                return c
+        return None
+
+    def add_ballot(self, ranking):
+        ballot = tuple(dict.fromkeys(c for c in ranking if c in self.rank))
+        if not ballot:
+            return
+        self.ballots += 1
+
+        # Décomptes des tours déjà joués, et premier tour dont l'issue change.
+        replay = None
+        for r, rnd in enumerate(self.rounds):
+            h = self.holder(ballot, r)
+            rnd["active"] += h is not None
+            if h is None:
+                continue
+            rnd["tallies"][h] += 1
+            if h == rnd["eliminated"]:
+                rnd["moved"][ballot] = rnd["moved"].get(ballot, 0) + 1
+            if replay is None and (
+                rnd["tallies"][h] * 2 > rnd["active"]
+                or (h == rnd["eliminated"] and self.lowest(rnd["tallies"]) != h)
+            ):
+                replay = r
+
+        self.place(ballot, 1)
+        if replay is not None:
+            self.rewind(replay)
+        self.run()
+
+    def place(self, ballot, n):
+        h = self.holder(ballot, len(self.rounds))
+        if h is None:
+            self.exhausted += n
+            return
+        pile = self.piles[h]
+        pile[ballot] = pile.get(ballot, 0) + n
+        self.tallies[h] += n
+
+    def remaining(self):
+        return [c for c in self.candidates if c not in self.elim_round]
+
+    def lowest(self, tallies):
+        return min(tallies, key=lambda c: (tallies[c], -self.rank[c]))
+
+    def rewind(self, r):
+        """Annule les tours r et suivants en rendant leurs groupes aux éliminés."""
+        while len(self.rounds) > r:
+            rnd = self.rounds.pop()
+            c = rnd["eliminated"]
+            for ballot, n in rnd["moved"].items():
+                h = self.holder(ballot, len(self.rounds) + 1)
+                if h is None:
+                    self.exhausted -= n
+                else:
+                    pile = self.piles[h]
+                    pile[ballot] -= n
+                    if not pile[ballot]:
+                        del pile[ballot]
+                    self.tallies[h] -= n
+            del self.elim_round[c]
+            self.piles[c]   = rnd["moved"]
+            self.tallies[c] = rnd["tallies"][c]
+        self.winner = None
+
+    def run(self):
+        """Élimine jusqu'à ce qu'un candidat ait la majorité des bulletins actifs."""
+        while self.ballots:
+            left    = {c: self.tallies[c] for c in self.remaining()}
+            active  = self.ballots - self.exhausted
+            leader  = max(left, key=lambda c: (left[c], -self.rank[c]))
+            if len(left) == 1 or left[leader] * 2 > active:
+                self.winner = leader
+                return
+            c = self.lowest(left)
+            moved = self.piles[c]
+            self.rounds.append({
+                "eliminated": c,
+                "tallies":    left,
+                "active":     active,
+                "moved":      moved,
+            })
+            self.elim_round[c] = len(self.rounds) - 1
+            self.piles[c]   = {}
+            self.tallies[c] = 0
+            for ballot, n in moved.items():
+                self.place(ballot, n)
+
+    def eliminated(self):
+        return [rnd["eliminated"] for rnd in self.rounds]
+
+    def standings(self):
+        """Décomptes du dernier tour, du plus au moins soutenu."""
+        return sorted(
+            ((c, self.tallies[c]) for c in self.remaining()),
+            key=lambda cv: (-cv[1], self.rank[cv[0]]),
+        )